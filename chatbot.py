@@ -4,76 +4,117 @@ this chatbot will be a simple AI model, so we need to RAG model, langchain, chro
 
 '''
 import os
-from sentence_transformers import SentenceTransformer
+from embedding_model import get_model, encode_query
 from overlap_chunking import load_and_chunk_documents
 from init_chroma import setup_vector_database, save_vector_database_to_file
-from vector_search import search_vector_database, augment_prompt_with_context
+from vector_search import (
+    search_vector_database,
+    asearch_vector_database,
+    augment_prompt_with_context,
+)
 from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.chat_history import InMemoryChatMessageHistory
 from langchain_core.messages import HumanMessage, AIMessage
 
 def process_user_query(query: str):
-    model = SentenceTransformer('all-MiniLM-L6-v2')  
+    model = get_model()  # shared instance, loaded once
 
     # Preprocess query
     cleaned_query = query.lower().strip()
-   
-    # Convert query to embedding
-    query_embedding = model.encode([cleaned_query])
-    return model, query_embedding[0]
 
-def generate_response(augmented_prompt: str) -> str:
+    # Convert query to embedding (cached for repeated questions)
+    query_embedding = encode_query(cleaned_query)
+    return model, query_embedding
+
+# Shared LLM client so each query reuses the same httpx connection pool
+# instead of re-reading env vars and opening a new client per call
+_LLM = None
+
+
+def _get_llm() -> ChatOpenAI:
+    global _LLM
+    if _LLM is None:
+        _LLM = ChatOpenAI(
+            model="mistralai/mistral-7b-instruct:free",  # free model on OpenRouter
+            temperature=1.1,
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            base_url=os.environ.get("OPENAI_API_BASE"))
+    return _LLM
+
+
+def generate_response(augmented_prompt: str):
     """
-    Generate response using LLM - OpenRouter.
+    Generate response using LLM - OpenRouter. Yields text pieces as they
+    arrive from the model instead of waiting for the full answer.
     """
-    model = ChatOpenAI(
-    model="mistralai/mistral-7b-instruct:free",  # free model on OpenRouter
-    temperature=1.1,
-    api_key=os.environ.get("OPENAI_API_KEY"),
-    base_url=os.environ.get("OPENAI_API_BASE") )
-    
-    response = ChatPromptTemplate.from_template(augmented_prompt)
-    chain = response | model
-
-    # invoke and return textual content
-    result = chain.invoke({})
-    try:
-        return result.content
-    except Exception:
-        # fallback: return str(result)
-        return str(result)
+    # Send the prompt as a plain message — running it through
+    # ChatPromptTemplate re-parsed it as a template and broke on literal
+    # braces in catalog text
+    for chunk in _get_llm().stream([HumanMessage(content=augmented_prompt)]):
+        try:
+            piece = chunk.content
+        except Exception:
+            # fallback: yield str(chunk)
+            piece = str(chunk)
+        if piece:
+            yield piece
+
+# Cached vector collection so we only read/chunk/embed the catalog once per
+# process instead of on every user query
+_COLLECTION = None
+
+
+def get_collection():
+    global _COLLECTION
+    if _COLLECTION is None:
+        _COLLECTION = setup_vector_database(load_and_chunk_documents())
+    return _COLLECTION
+
 
 # Global in-memory chat history
 chat_history = InMemoryChatMessageHistory()
 
 
+# Keep at most this many messages in the in-memory history so it doesn't
+# grow unbounded over a long session
+MAX_HISTORY_MESSAGES = 50
+
+
 def serialize_history(history: InMemoryChatMessageHistory, max_chars: int = 2000) -> str:
     """Serialize chat history to a single text block suitable for injecting into prompts.
 
-    Keeps the most recent content that fits within max_chars.
+    Keeps the most recent content that fits within max_chars. Walks the
+    messages newest-first and stops once the budget is exhausted, so long
+    histories don't pay O(N) string work for a tiny keep-set.
     """
     # messages is a list of BaseMessage objects that have .__class__.__name__ and .content
     parts = []
-    for msg in history.messages:
+    total = 0
+    for msg in reversed(history.messages):
         role = msg.__class__.__name__
         content = getattr(msg, 'content', str(msg))
-        parts.append(f"{role}: {content}")
+        s = f"{role}: {content}"
+        parts.append(s)
+        total += len(s) + 1  # +1 for the joining newline
+        if total >= max_chars:
+            break
 
-    full = "\n".join(parts)
+    full = "\n".join(reversed(parts))
     # trim to last max_chars characters
     if len(full) > max_chars:
         full = full[-max_chars:]
     return full
 
-def run_complete_rag_pipeline(query: str):
-    """
-    Run the complete RAG pipeline from start to finish.
-    """
 
-    chunks = load_and_chunk_documents()
+def _trim_history(history: InMemoryChatMessageHistory, max_messages: int = MAX_HISTORY_MESSAGES):
+    """Drop the oldest messages once the history exceeds max_messages."""
+    if len(history.messages) > max_messages:
+        history.messages = history.messages[-max_messages:]
 
-    collection = setup_vector_database(chunks)
+def _build_augmented_prompt(query: str) -> str:
+    """Retrieval half of the pipeline: embed the query, search the collection,
+    record the question in history and build the augmented prompt."""
+    collection = get_collection()
 
     model, query_embedding = process_user_query(query)
 
@@ -85,26 +126,80 @@ def run_complete_rag_pipeline(query: str):
 
     history_text = serialize_history(chat_history)
 
-    augmented_prompt = augment_prompt_with_context(
+    return augment_prompt_with_context(
         query, search_results, history_text=history_text, use_history=True
     )
 
-    # Generate an answer
-    answer = generate_response(augmented_prompt)
 
-    # Save assistant reply into history
+async def _abuild_augmented_prompt(query: str) -> str:
+    """Async counterpart of `_build_augmented_prompt`: retrieval goes through
+    asearch_vector_database, so concurrent questions (several Gradio sessions)
+    get coalesced into one batched Chroma query instead of queueing."""
+    collection = get_collection()
+
+    model, query_embedding = process_user_query(query)
+
+    search_results = await asearch_vector_database(collection, query_embedding)
+
+    chat_history.add_user_message(HumanMessage(content=query))
+
+    history_text = serialize_history(chat_history)
+
+    return augment_prompt_with_context(
+        query, search_results, history_text=history_text, use_history=True
+    )
+
+
+def _record_answer(answer: str):
+    """Save an assistant reply into the bounded chat history."""
     try:
         chat_history.add_ai_message(AIMessage(content=answer))
     except Exception:
         # If AIMessage wrapper isn't available or fails, fallback to raw string
         chat_history.add_ai_message(answer)
+    _trim_history(chat_history)
+
+
+def run_complete_rag_pipeline(query: str):
+    """
+    Run the complete RAG pipeline from start to finish.
+
+    This is a generator: it yields answer pieces as the LLM streams them, so
+    UIs can show real token-by-token output. Join the pieces for a full answer.
+    """
+    augmented_prompt = _build_augmented_prompt(query)
+
+    # Generate an answer, streaming pieces out as they arrive
+    answer_parts = []
+    for piece in generate_response(augmented_prompt):
+        answer_parts.append(piece)
+        yield piece
+    _record_answer("".join(answer_parts))
+
+
+async def arun_complete_rag_pipeline(query: str):
+    """
+    Async variant of `run_complete_rag_pipeline` for async UIs (Gradio):
+    retrieval runs through the batched async search and the OpenRouter
+    call through astream, so the event loop isn't blocked while waiting
+    on the network.
+    """
+    augmented_prompt = await _abuild_augmented_prompt(query)
 
-    return answer
+    answer_parts = []
+    async for chunk in _get_llm().astream([HumanMessage(content=augmented_prompt)]):
+        piece = getattr(chunk, 'content', None) or ''
+        if piece:
+            answer_parts.append(piece)
+            yield piece
+    _record_answer("".join(answer_parts))
 
 if __name__ == "__main__":
     while True:
         q = input("\nQuestion (type 'exit' to quit): ").strip()
         if q.lower() in {"exit", "quit"}:
             break
-        print(run_complete_rag_pipeline(q))
+        for piece in run_complete_rag_pipeline(q):
+            print(piece, end="", flush=True)
+        print()
     save_vector_database_to_file()
\ No newline at end of file
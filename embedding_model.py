@@ -0,0 +1,95 @@
+"""
+Shared SentenceTransformer instance for the whole app.
+
+Loading 'all-MiniLM-L6-v2' costs a ~90MB model read plus tokenizer init, so we
+do it once lazily and hand the same instance to every caller instead of
+reloading per query (chatbot.py) and again at import time (init_chroma.py).
+"""
+
+import functools
+import os
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+_MODEL = None
+
+
+def _pick_device() -> str:
+    if torch.cuda.is_available():
+        return 'cuda'
+    if getattr(torch.backends, 'mps', None) is not None and torch.backends.mps.is_available():
+        return 'mps'
+    return 'cpu'
+
+
+def get_model() -> SentenceTransformer:
+    """Return the shared embedding model, loading it on first use.
+
+    On CUDA/MPS the weights are loaded in float16 (halves memory bandwidth,
+    negligible accuracy loss for MiniLM); on CPU we keep fp32 since fp16
+    can actually be slower there.
+
+    On CPU we prefer the ONNX Runtime backend (fused LayerNorm/GELU/MatMul
+    kernels, ~40% faster than the PyTorch path for MiniLM). Override with
+    the SENTENCE_TRANSFORMERS_BACKEND env var ('torch' or 'onnx'); if the
+    onnx backend can't load (optimum/onnxruntime missing or broken) we print
+    a warning and fall back to torch.
+    """
+    global _MODEL
+    if _MODEL is None:
+        device = _pick_device()
+        backend = os.environ.get('SENTENCE_TRANSFORMERS_BACKEND')
+        if backend is None:
+            backend = 'onnx' if device == 'cpu' else 'torch'
+
+        if backend == 'onnx':
+            try:
+                _MODEL = SentenceTransformer(MODEL_NAME, device=device, backend='onnx')
+            except Exception as e:
+                print(f"Warning: ONNX backend unavailable ({e}), falling back to torch")
+                backend = 'torch'
+
+        if _MODEL is None:
+            model_kwargs = {"torch_dtype": torch.float16} if device != 'cpu' else {}
+            _MODEL = SentenceTransformer(MODEL_NAME, device=device, model_kwargs=model_kwargs)
+            if device == 'cpu' and os.environ.get('EMBED_QUANTIZE', '1') == '1':
+                # int8 dynamic quantization of the Linear layers: ~2-3x CPU
+                # throughput over fp32 for MiniLM with <1% accuracy delta.
+                # Set EMBED_QUANTIZE=0 to keep fp32 weights.
+                try:
+                    from torch.quantization import quantize_dynamic
+                    _MODEL[0].auto_model = quantize_dynamic(
+                        _MODEL[0].auto_model, {torch.nn.Linear}, dtype=torch.qint8
+                    )
+                except Exception as e:
+                    print(f"Warning: dynamic quantization failed ({e}), keeping fp32")
+    return _MODEL
+
+
+# Query-embedding cache: users often re-ask the same question, so keep the
+# last 1024 query embeddings around. ndarrays aren't hashable, so the cached
+# value is the raw float32 buffer and encode_query rebuilds the array view.
+_cache_hits = 0
+_cache_misses = 0
+
+
+@functools.lru_cache(maxsize=1024)
+def _encode_cached(text: str) -> bytes:
+    global _cache_misses
+    _cache_misses += 1
+    embedding = get_model().encode([text], convert_to_numpy=True, normalize_embeddings=True)[0]
+    return embedding.astype(np.float32).tobytes()
+
+
+def encode_query(text: str) -> np.ndarray:
+    """Encode a single query string, serving repeats from an in-memory LRU."""
+    global _cache_hits
+    buf = _encode_cached(text)
+    _cache_hits += 1
+    if os.environ.get('EMBED_CACHE_DEBUG'):
+        # _cache_hits counts every call, _cache_misses only actual encodes
+        print(f"embed cache: {_cache_hits - _cache_misses} hits / {_cache_misses} misses")
+    return np.frombuffer(buf, dtype=np.float32)
@@ -1,10 +1,9 @@
-import time
 import gradio as gr
 
 try:
-    from chatbot import run_complete_rag_pipeline
+    from chatbot import arun_complete_rag_pipeline
 except Exception:
-    run_complete_rag_pipeline = None
+    arun_complete_rag_pipeline = None
 
 CSS = """
 @import url('https://fonts.googleapis.com/css2?family=Poppins:wght@600;700&display=swap');
@@ -62,39 +61,31 @@ label[for="msg_input"] { display: none !important; }
 @keyframes blink { 0%,20%{opacity:.25;}50%{opacity:1;}100%{opacity:.25;} }
 """
 
-def _stream_text(answer: str, delay: float = 0.02):
-    buf = []
-    for token in answer.split():
-        buf.append(token)
-        if len(buf) >= 3:
-            yield " ".join(buf) + " "
-            time.sleep(delay)
-            buf = []
-    if buf:
-        yield " ".join(buf)
-
 def _typing_html():
     return '<span class="typing"><span class="dot">●</span><span class="dot">●</span><span class="dot">●</span></span>'
 
-def respond(message, history):
+async def respond(message, history):
     if history is None:
         history = []
 
     history = history + [(message, _typing_html())]
     yield gr.update(value=""), history, gr.update(interactive=False), gr.update(interactive=False)
 
+    # Stream pieces straight from the LLM — the async generator keeps the
+    # Gradio event loop free while waiting on the network
+    streamed = ""
     try:
-        full_answer = run_complete_rag_pipeline(message) if callable(run_complete_rag_pipeline) else f"Echo: {message}"
+        if callable(arun_complete_rag_pipeline):
+            async for piece in arun_complete_rag_pipeline(message):
+                streamed += piece
+                history[-1] = (message, streamed)
+                yield gr.update(value=""), history, gr.update(interactive=False), gr.update(interactive=False)
+        else:
+            streamed = f"Echo: {message}"
     except Exception as e:
-        full_answer = f"Error: {e}"
-
-    streamed = ""
-    for chunk in _stream_text(full_answer):
-        streamed += chunk
-        history[-1] = (message, streamed)
-        yield gr.update(value=""), history, gr.update(interactive=False), gr.update(interactive=False)
+        streamed = f"Error: {e}"
 
-    history[-1] = (message, full_answer)
+    history[-1] = (message, streamed)
     yield gr.update(value=""), history, gr.update(interactive=True), gr.update(interactive=True)
 
 with gr.Blocks(css=CSS, theme=gr.themes.Soft(), elem_id="app") as demo:
@@ -126,4 +117,7 @@ with gr.Blocks(css=CSS, theme=gr.themes.Soft(), elem_id="app") as demo:
     txt.submit(respond, [txt, chatbot], [txt, chatbot, txt, send])
     send.click(respond, [txt, chatbot], [txt, chatbot, txt, send])
 
-demo.launch()
+# Guarded so importing this module (e.g. a spawned ProcessPoolExecutor worker
+# re-importing __main__ during catalog parsing) doesn't start a second server
+if __name__ == "__main__":
+    demo.launch()
@@ -1,10 +1,103 @@
 import chromadb
+import hashlib
 import json, os
-from sentence_transformers import SentenceTransformer
+import numpy as np
+import torch
+from embedding_model import get_model
 from utils import read_docs
 from typing import List, Dict
+try:
+    import orjson
+except Exception:
+    orjson = None
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
+
+# In-process mirror of the embeddings added this run, kept as one contiguous
+# float32 matrix so scoring against all chunks is a single BLAS matrix-vector
+# product instead of N per-pair Python calls. An int8 scalar-quantized copy
+# (4x fewer bytes per distance) serves as the first scoring pass; the fp32
+# matrix is only touched to re-rank the top candidates.
+EMBEDDING_MATRIX = None
+EMBEDDING_IDS = []
+EMBEDDING_CODES = None
+_CODE_MIN = None
+_CODE_SCALE = None
+
+# How many int8 first-pass candidates get an exact fp32 re-rank
+RERANK_TOP = 50
+
+# Below this many vectors the CPU path wins (transfer overhead dominates);
+# above it, brute-force scoring moves to the GPU when one is available
+GPU_SCORE_THRESHOLD = 100_000
+_GPU_MATRIX = None
+
+
+def _quantize_embeddings(matrix):
+    """Per-dimension scalar quantization of a float32 matrix to int8 codes.
+
+    Returns (codes, mins, scale) such that x ~= codes * scale / 127 + mins.
+    """
+    mins = matrix.min(axis=0)
+    scale = matrix.max(axis=0) - mins
+    scale[scale == 0] = 1.0
+    codes = np.round((matrix - mins) * 127.0 / scale).astype(np.int8)
+    return codes, mins, scale
+
+
+def score_all(query_embedding):
+    """Cosine-score a unit-norm query against the in-process embedding mirror.
+
+    Runs a cheap int8 first pass over every stored vector, then re-scores the
+    RERANK_TOP best candidates exactly in fp32, so the returned array is exact
+    where it matters (the top of the ranking). Returns a 1D array of
+    similarities aligned with EMBEDDING_IDS, or None if the mirror has not
+    been populated by setup_vector_database yet.
+    """
+    if EMBEDDING_MATRIX is None:
+        return None
+    q = np.ascontiguousarray(query_embedding, dtype=np.float32)
+
+    # Large catalogs: one exact matmul on the GPU beats any CPU multi-pass —
+    # the matrix is mirrored to device memory once and reused across queries
+    if EMBEDDING_MATRIX.shape[0] >= GPU_SCORE_THRESHOLD and torch.cuda.is_available():
+        try:
+            global _GPU_MATRIX
+            if _GPU_MATRIX is None or _GPU_MATRIX.shape[0] != EMBEDDING_MATRIX.shape[0]:
+                _GPU_MATRIX = torch.from_numpy(EMBEDDING_MATRIX).cuda()
+            scores = _GPU_MATRIX @ torch.from_numpy(q).cuda()
+            return scores.cpu().numpy()
+        except Exception as e:
+            print(f"Warning: GPU scoring failed ({e}), falling back to CPU")
+
+    if EMBEDDING_CODES is None or len(EMBEDDING_IDS) <= RERANK_TOP:
+        return EMBEDDING_MATRIX @ q
+
+    # int8 first pass, dequantized back into inner-product units: with
+    # x ~= codes * scale / 127 + mins, dot(x, q) expands to
+    # codes @ (q * scale / 127) + mins . q — fold the per-dim scales into the
+    # query once, so the approximate scores live on the same scale as the
+    # exact fp32 similarities written over the top candidates below.
+    w = np.asarray(q * _CODE_SCALE * (1.0 / 127.0), dtype=np.float32)
+    bias = float(_CODE_MIN @ q)
+    scores = EMBEDDING_CODES @ w
+    scores += bias
+
+    top = np.argpartition(-scores, RERANK_TOP)[:RERANK_TOP]
+    scores[top] = EMBEDDING_MATRIX[top] @ q
+    return scores
+
+
+# Embeddings are stored unit-norm, so inner product gives the same ranking as
+# cosine but is cheaper per comparison. The HNSW graph is tuned explicitly
+# (M=16, ef_construction=64, ef_search=40) instead of relying on defaults:
+# O(log N) traversals with a search beam sized for top-3 retrieval on a
+# catalog-scale index.
+_HNSW_METADATA = {
+    "hnsw:space": "ip",
+    "hnsw:M": 16,
+    "hnsw:construction_ef": 64,
+    "hnsw:search_ef": 40,
+}
 
 
 def setup_vector_database(chunks: List[Dict]):
@@ -14,13 +107,36 @@ def setup_vector_database(chunks: List[Dict]):
     chroma_client = chromadb.PersistentClient(path="./chroma_db") # this makes the db persistent
     try:
         collection = chroma_client.create_collection(
-            name="catalog",  
-            metadata={"hnsw:space": "cosine"}  # using cosine similarity
+            name="catalog",
+            metadata=_HNSW_METADATA,
         )
     except Exception:
         # Collection already exists, get it
         collection = chroma_client.get_collection("catalog")
-   
+
+    # No chunks usually means the catalog directory is missing or empty
+    # (renamed dir, wrong cwd) — bail out before the stale-id prune below,
+    # which would otherwise treat every stored id as stale and wipe the store
+    if not chunks:
+        print("Warning: no chunks to ingest, leaving the stored collection untouched")
+        return collection
+
+    # HNSW parameters are fixed at creation time, so a collection built before
+    # the tuning (the shipped chroma_db has cosine space and ef=100 defaults)
+    # would keep its old index forever. Recreate it when the settings differ —
+    # the prune/encode/upsert path below repopulates the fresh collection in
+    # this same call, a one-time re-ingest per database.
+    stored_meta = collection.metadata or {}
+    if any(stored_meta.get(k) != v for k, v in _HNSW_METADATA.items()):
+        try:
+            chroma_client.delete_collection("catalog")
+            collection = chroma_client.create_collection(
+                name="catalog",
+                metadata=_HNSW_METADATA,
+            )
+        except Exception as e:
+            print(f"Warning: Could not rebuild collection with tuned index settings: {e}")
+
     # Prepare data for storage with embeddings and richer metadata
     ids = [chunk["id"] for chunk in chunks]
     documents = [chunk.get("content", "") for chunk in chunks]
@@ -28,9 +144,14 @@ def setup_vector_database(chunks: List[Dict]):
     metadatas = []
     for chunk in chunks:
         meta = {
-            "title": chunk.get("title", ""),
+            # Pre-fill a display title at ingest so the prompt builder can
+            # index it directly instead of re-deriving a default per query
+            "title": chunk.get("title") or f"Doc {chunk.get('source_doc') or chunk['id']}",
             "category": chunk.get("category", ""),
             "source": chunk.get("source_doc") or chunk.get("source_pdf") or "",
+            # Where this chunk sits in its source document — the content-hash
+            # id is stable across re-ingests but deliberately position-blind
+            "positional_id": chunk.get("positional_id", ""),
         }
         # Add page-related metadata if present
         if "page_index" in chunk:
@@ -40,13 +161,26 @@ def setup_vector_database(chunks: List[Dict]):
             meta["has_page_tables"] = bool(chunk.get("page_tables"))
         metadatas.append(meta)
 
-    # Compute embeddings for all documents using the sentence-transformers model
-    # The model.encode accepts a list of texts and returns a 2D array
-    embeddings = model.encode(documents, show_progress_bar=False)
+    # Drop stored chunks whose id is no longer produced by the chunker. This
+    # covers both removed catalog content and id-scheme changes (the store may
+    # hold chunks under the old positional ids) — without it, a re-ingest
+    # would add the same text again under new ids and retrieval would surface
+    # duplicates.
+    current_ids = set(ids)
+    try:
+        stored = collection.get(include=[])
+        stale = [cid for cid in stored.get("ids", []) if cid not in current_ids]
+        if stale:
+            collection.delete(ids=stale)
+    except Exception as e:
+        print(f"Warning: Could not prune stale chunks: {e}")
 
-    # If collection is empty, add everything. Otherwise filter out existing ids.
+    # Check which ids are already stored BEFORE encoding, so re-runs don't
+    # pay the transformer forward pass for chunks that are already in Chroma.
+    # include=[] keeps the check id-only instead of materializing every
+    # stored document just to read its id.
     try:
-        existing = collection.get(ids=ids)
+        existing = collection.get(ids=ids, include=[])
         existing_ids = set(existing.get("ids", []))
     except Exception:
         existing_ids = set()
@@ -56,8 +190,59 @@ def setup_vector_database(chunks: List[Dict]):
         add_ids = [ids[i] for i in to_add]
         add_docs = [documents[i] for i in to_add]
         add_metas = [metadatas[i] for i in to_add]
-        add_embs = [embeddings[i].tolist() if hasattr(embeddings[i], 'tolist') else embeddings[i] for i in to_add]
-        collection.add(ids=add_ids, documents=add_docs, metadatas=add_metas, embeddings=add_embs)
+
+        # Identical chunk text shows up across revisions (shared headers and
+        # footers are common in catalogs) — hash the content and encode each
+        # unique text only once, then map embeddings back per chunk.
+        unique_map = {}
+        unique_docs = []
+        idx_to_unique = []
+        for doc in add_docs:
+            h = hashlib.blake2b(doc.encode("utf-8"), digest_size=16).digest()
+            if h not in unique_map:
+                unique_map[h] = len(unique_docs)
+                unique_docs.append(doc)
+            idx_to_unique.append(unique_map[h])
+
+        # Encode the unique documents, sorted by length so each batch pads to
+        # similar sequence lengths (less wasted compute), then put the
+        # embeddings back in their original order.
+        order = sorted(range(len(unique_docs)), key=lambda i: len(unique_docs[i]))
+        sorted_embeddings = get_model().encode(
+            [unique_docs[i] for i in order],
+            batch_size=128 if torch.cuda.is_available() else 32,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        unique_embeddings = np.empty_like(sorted_embeddings)
+        unique_embeddings[order] = sorted_embeddings
+
+        # One fancy-index over the unique matrix expands back to per-chunk
+        # embeddings as a single contiguous array — no per-element .tolist()
+        # building thousands of boxed Python floats; Chroma accepts ndarrays.
+        add_embs = unique_embeddings[idx_to_unique]
+
+        # upsert is insert-or-replace server-side, so a chunk whose content
+        # changed under a reused id gets updated instead of raising on add
+        collection.upsert(ids=add_ids, documents=add_docs, metadatas=add_metas, embeddings=add_embs)
+
+    # Mirror the whole catalog for in-process scoring via score_all: fp32
+    # matrix for exact re-ranking, int8 codes for the cheap first pass.
+    # Fetch from the collection rather than keeping only what this run
+    # encoded — on a warm start everything is already stored and nothing was
+    # encoded at all, but score_all should still cover every chunk.
+    global EMBEDDING_MATRIX, EMBEDDING_IDS, EMBEDDING_CODES, _CODE_MIN, _CODE_SCALE
+    try:
+        stored = collection.get(ids=ids, include=["embeddings"])
+        if len(stored.get("ids", [])) > 0:
+            EMBEDDING_IDS = list(stored["ids"])
+            EMBEDDING_MATRIX = np.ascontiguousarray(
+                np.asarray(stored["embeddings"], dtype=np.float32)
+            )
+            EMBEDDING_CODES, _CODE_MIN, _CODE_SCALE = _quantize_embeddings(EMBEDDING_MATRIX)
+    except Exception as e:
+        print(f"Warning: Could not mirror stored embeddings: {e}")
     return collection
 
 def save_vector_database_to_file( filename="vectordb_backup.json"):
@@ -67,14 +252,17 @@ def save_vector_database_to_file( filename="vectordb_backup.json"):
     chroma_client = chromadb.PersistentClient(path="./chroma_db")
     collection = chroma_client.get_collection("catalog")
 
-    with open("vectordb_backup.json", "w") as f:
-        json.dump(
-            {
-                "documents": collection.get()["documents"],
-                "ids": collection.get()["ids"],
-                "metadatas": collection.get()["metadatas"],
-                "count": collection.count()
-            },
-            f,
-            indent=2
-        )
+    # One full scan instead of three — collection.get() returns everything
+    data = collection.get()
+    payload = {
+        "documents": data["documents"],
+        "ids": data["ids"],
+        "metadatas": data["metadatas"],
+        "count": collection.count()
+    }
+    if orjson is not None:
+        with open(filename, "wb") as f:
+            f.write(orjson.dumps(payload))
+    else:
+        with open(filename, "w") as f:
+            json.dump(payload, f, indent=2)
@@ -1,8 +1,53 @@
 from typing import List, Dict, Union, Optional
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from utils import read_docs
+import functools
+import glob
+import hashlib
+import os
+import pickle
 import re
 
+CHUNKS_CACHE_FILE = "chunks_cache.pkl"
+
+# Matches the table-doc ids produced by utils (e.g. "catalog_table_3")
+_TABLE_ID_RE = re.compile(r"_table_\d+$")
+
+
+def _chunk_id(text: str) -> str:
+    """Content-addressed chunk id: identical text always maps to the same id,
+    so re-runs and reordered documents don't defeat the already-stored skip
+    in setup_vector_database."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+# Don't bother splitting text shorter than this (blank backs, ToC stubs, etc.)
+# — the splitter's separator scans scale with text length and near-empty
+# pages are common in extracted PDFs.
+MIN_TEXT_LEN = 32
+
+
+@functools.lru_cache(maxsize=8)
+def _get_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """Build (and reuse) a splitter per settings pair — split_text is stateless,
+    so the same instance can serve every chunk_documents call."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", ". ", " ", ""]
+    )
+
+
+def _catalog_cache_key(**kwargs) -> str:
+    """Hash of (path, mtime) for every catalog file plus the chunking kwargs,
+    so the chunk cache is invalidated whenever a file or a setting changes."""
+    entries = []
+    for file_path in sorted(glob.glob("catalog/**/*", recursive=True)):
+        if os.path.isfile(file_path):
+            entries.append(f"{file_path}:{os.path.getmtime(file_path)}")
+    entries.append(repr(sorted(kwargs.items())))
+    return hashlib.md5("|".join(entries).encode("utf-8")).hexdigest()
+
 
 def chunk_documents(docs: List[Union[str, Dict]], *, chunk_size: int = 1000, chunk_overlap: int = 200, smart: bool = False, per_page: bool = True) -> List[Dict]:
     """
@@ -14,12 +59,7 @@ def chunk_documents(docs: List[Union[str, Dict]], *, chunk_size: int = 1000, chu
       - id, title, content, category, source_doc
     """
     # Use a splitter that prefers paragraph and sentence boundaries.
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
+    text_splitter = _get_splitter(chunk_size, chunk_overlap)
 
     normalized_docs: List[Dict] = []
     for idx, doc in enumerate(docs):
@@ -65,10 +105,11 @@ def chunk_documents(docs: List[Union[str, Dict]], *, chunk_size: int = 1000, chu
         # Smart mode: handle PDFs with pages and table-docs specially
         if smart:
             # If this is a table doc (created by utils), treat it as atomic
-            if doc.get("source_pdf") or re.search(r"_table_\d+$", doc.get("id", "")):
+            if doc.get("source_pdf") or _TABLE_ID_RE.search(doc.get("id", "")):
                 # Do not split tables by default — make them first-class units
                 all_chunks.append({
-                    "id": f"{doc['id']}_chunk_0",
+                    "id": _chunk_id(doc.get("content", "")),
+                    "positional_id": f"{doc['id']}_chunk_0",
                     "title": doc.get("title", ""),
                     "content": doc.get("content", ""),
                     "category": doc.get("category", ""),
@@ -81,12 +122,13 @@ def chunk_documents(docs: List[Union[str, Dict]], *, chunk_size: int = 1000, chu
             if per_page and doc.get("pages"):
                 for p_idx, page in enumerate(doc.get("pages", [])):
                     page_text = page.get("text", "")
-                    if not page_text:
+                    if not page_text or len(page_text.strip()) < MIN_TEXT_LEN:
                         continue
                     page_chunks = text_splitter.split_text(page_text)
                     for i, chunk in enumerate(page_chunks):
                         ch = {
-                            "id": f"{doc['id']}_p{p_idx}_chunk_{i}",
+                            "id": _chunk_id(chunk),
+                            "positional_id": f"{doc['id']}_p{p_idx}_chunk_{i}",
                             "title": doc.get("title", ""),
                             "content": chunk,
                             "category": doc.get("category", ""),
@@ -101,10 +143,13 @@ def chunk_documents(docs: List[Union[str, Dict]], *, chunk_size: int = 1000, chu
 
             # Fallback for smart mode: split the doc content as usual
             content_to_split = doc.get("content", "")
+            if len(content_to_split.strip()) < MIN_TEXT_LEN:
+                continue
             chunks = text_splitter.split_text(content_to_split)
             for i, chunk in enumerate(chunks):
                 all_chunks.append({
-                    "id": f"{doc['id']}_chunk_{i}",
+                    "id": _chunk_id(chunk),
+                    "positional_id": f"{doc['id']}_chunk_{i}",
                     "title": doc.get("title", ""),
                     "content": chunk,
                     "category": doc.get("category", ""),
@@ -113,10 +158,13 @@ def chunk_documents(docs: List[Union[str, Dict]], *, chunk_size: int = 1000, chu
             continue
 
         # Simple mode (backwards compatible): chunk whole content
+        if not doc.get("content", "").strip():
+            continue
         chunks = text_splitter.split_text(doc.get("content", ""))
         for i, chunk in enumerate(chunks):
             all_chunks.append({
-                "id": f"{doc['id']}_chunk_{i}",
+                "id": _chunk_id(chunk),
+                "positional_id": f"{doc['id']}_chunk_{i}",
                 "title": doc.get("title", ""),
                 "content": chunk,
                 "category": doc.get("category", ""),
@@ -127,7 +175,16 @@ def chunk_documents(docs: List[Union[str, Dict]], *, chunk_size: int = 1000, chu
                 all_chunks[-1]["source_pages"] = doc.get("pages")
                 all_chunks[-1]["source_tables"] = doc.get("tables")
 
-    return all_chunks
+    # Content-addressed ids mean identical text collapses to the same id —
+    # keep the first occurrence so a single upsert batch never repeats an id
+    seen_ids = set()
+    unique_chunks = []
+    for ch in all_chunks:
+        if ch["id"] in seen_ids:
+            continue
+        seen_ids.add(ch["id"])
+        unique_chunks.append(ch)
+    return unique_chunks
 
 
 def load_and_chunk_documents(docs: Optional[List[Union[str, Dict]]] = None, **kwargs) -> List[Dict]:
@@ -140,7 +197,27 @@ def load_and_chunk_documents(docs: Optional[List[Union[str, Dict]]] = None, **kw
     pdf_parse = kwargs.pop("pdf_parse", False)
 
     if docs is None:
+        # Re-reading and re-chunking the catalog (PDF parsing included) is the
+        # slow part of a cold start, so cache the chunks on disk keyed by the
+        # catalog files' mtimes and skip all of it when nothing changed.
+        cache_key = _catalog_cache_key(structured=structured, pdf_parse=pdf_parse, **kwargs)
+        try:
+            with open(CHUNKS_CACHE_FILE, "rb") as f:
+                cached = pickle.load(f)
+            if cached.get("key") == cache_key:
+                return cached["chunks"]
+        except Exception:
+            pass
+
         docs, paths = read_docs(structured=structured, pdf_parse=pdf_parse)
+        chunks = chunk_documents(docs, **kwargs)
+
+        try:
+            with open(CHUNKS_CACHE_FILE, "wb") as f:
+                pickle.dump({"key": cache_key, "chunks": chunks}, f)
+        except Exception as e:
+            print(f"Warning: Could not write chunk cache: {e}")
+        return chunks
 
     # If structured documents were returned as dicts, pass them through
     return chunk_documents(docs, **kwargs)
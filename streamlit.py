@@ -8,6 +8,5 @@ st.title("📚 Course Catalog Assistant")
 query = st.text_input("Ask a question:")
 
 if st.button("Send") and query:
-    answer = run_complete_rag_pipeline(query)
     st.write("**Answer:**")
-    st.write(answer)
+    st.write_stream(run_complete_rag_pipeline(query))
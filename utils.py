@@ -3,7 +3,9 @@ Common utilities for RAG search methods
 """
 
 import os
-import glob
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from PyPDF2 import PdfReader
 import json
 try:
@@ -71,184 +73,210 @@ def _table_to_markdown(table):
     return "\n".join(md)
 
 
-def read_docs(structured: bool = False, pdf_parse: bool = False):
-    """Read documents from the `catalog/` directory.
-
-    If `structured` is False (default) returns (docs_texts, paths) where docs_texts
-    is a list of strings (document contents) and paths the matching file paths.
+def _parse_one(file_path: str, structured: bool = False, pdf_parse: bool = False):
+    """Parse a single catalog file into (docs, doc_paths) lists.
 
-    If `structured` is True the function will also load .json/.jsonl/.yml/.yaml
-    files and return (docs, paths) where docs is a list of dicts containing at
-    least 'content' and optional 'id', 'title', 'category'. For backwards
-    compatibility, PDF/TXT/MD files still return plain string documents.
+    This is the per-file body of `read_docs`, kept as a top-level function so
+    it can be pickled and dispatched to a process pool.
     """
     docs = []
     doc_paths = []
+    try:
+        if structured and (file_path.endswith('.json') or file_path.endswith('.jsonl') or file_path.endswith('.ndjson') or file_path.endswith('.yml') or file_path.endswith('.yaml')):
+            parsed = _parse_structured_file(file_path)
+            for obj in parsed:
+                # Normalize to expected dict shape
+                content = obj.get('content') or obj.get('text') or obj.get('body') or ''
+                if not content:
+                    # If there's no explicit content, try to stringify the object
+                    content = json.dumps(obj)
+                doc = {
+                    'id': str(obj.get('id', os.path.basename(file_path))),
+                    'title': obj.get('title', ''),
+                    'content': content,
+                    'category': obj.get('category', '')
+                }
+                docs.append(doc)
+                doc_paths.append(file_path)
+        else:
+            # For non-structured files (pdf/txt/md) we either return plain strings
+            # (backwards compatibility) or normalized dicts when structured=True
+            if file_path.endswith(".pdf"):
+                # Single-pass extraction: when pdf_parse=True and pdfplumber is
+                # available, one pdfplumber pass produces text, pages and tables.
+                # PyPDF2 is only used when pdfplumber is missing or comes up empty.
+                content = ""
+                pages = []
+                tables = []
+                pdf_title = ""
 
-    possible_paths = [
-        "catalog/**/*.txt",  # all txt files in catalog and subdirs
-        "catalog/**/*.md",   # all markdown files in catalog and subdirs
-        "catalog/**/*.pdf",  # all pdf files in catalog and subdirs
-    ]
-
-    # If structured reading is enabled, also look for JSON/JSONL/YAML files
-    if structured:
-        possible_paths = [
-            "catalog/**/*.jsonl",
-            "catalog/**/*.ndjson",
-            "catalog/**/*.json",
-            "catalog/**/*.yml",
-            "catalog/**/*.yaml",
-        ] + possible_paths
+                _pdfplumber = None
+                if pdf_parse:
+                    try:
+                        import importlib
+                        _pdfplumber = importlib.import_module('pdfplumber')
+                    except Exception:
+                        _pdfplumber = None
 
-    files = []
-    for pattern in possible_paths:
-        files = glob.glob(pattern, recursive=True)
-        if files:
-            break
+                if _pdfplumber is not None:
+                    try:
+                        with _pdfplumber.open(file_path) as pdf:
+                            pdf_title = (pdf.metadata or {}).get('Title') or ''
+                            for p in pdf.pages:
+                                # Fast-path: image-only pages have no chars, skip
+                                # the expensive char-clustering in extract_text
+                                if not p.chars:
+                                    pages.append({"text": "", "tables": []})
+                                    continue
+                                text = p.extract_text() or ""
+                                page_tables = []
+                                try:
+                                    for tbl in p.extract_tables():
+                                        # Each table is a list of rows (lists of cell strings)
+                                        page_tables.append(tbl)
+                                        tables.append(tbl)
+                                except Exception:
+                                    # extracting tables can fail on some pages, continue
+                                    pass
+                                pages.append({"text": text, "tables": page_tables})
+                        content = "\n".join([p.get("text", "") for p in pages]).strip()
+                    except Exception as e:
+                        print(f"Warning: pdfplumber failed for {file_path}: {e}")
 
-    for file_path in files:
-        try:
-            if structured and (file_path.endswith('.json') or file_path.endswith('.jsonl') or file_path.endswith('.ndjson') or file_path.endswith('.yml') or file_path.endswith('.yaml')):
-                parsed = _parse_structured_file(file_path)
-                for obj in parsed:
-                    # Normalize to expected dict shape
-                    content = obj.get('content') or obj.get('text') or obj.get('body') or ''
-                    if not content:
-                        # If there's no explicit content, try to stringify the object
-                        content = json.dumps(obj)
-                    doc = {
-                        'id': str(obj.get('id', os.path.basename(file_path))),
-                        'title': obj.get('title', ''),
-                        'content': content,
-                        'category': obj.get('category', '')
-                    }
-                    docs.append(doc)
-                    doc_paths.append(file_path)
-            else:
-                # For non-structured files (pdf/txt/md) we either return plain strings
-                # (backwards compatibility) or normalized dicts when structured=True
-                if file_path.endswith(".pdf"):
-                    # Use PyPDF2 for basic text extraction, but if pdf_parse=True and
-                    # pdfplumber is available, use it to extract tables and page-level text
-                    content = ""
+                if not content:
+                    # Fallback: PyPDF2 full-text extraction
                     pages = []
                     tables = []
-
-                    # First try PyPDF2 to get a full-text fallback
                     try:
-                        reader = PdfReader(file_path)
-                        for page in reader.pages:
-                            page_text = page.extract_text() or ""
-                            pages.append({"text": page_text})
-                            content += page_text + "\n"
+                        with open(file_path, "rb") as fh:
+                            reader = PdfReader(fh)
+                            for page in reader.pages:
+                                page_text = page.extract_text() or ""
+                                pages.append({"text": page_text})
+                                content += page_text + "\n"
+                            # Metadata is read lazily from the stream, so it
+                            # has to happen while the file handle is open
+                            meta = getattr(reader, 'metadata', None)
+                            if meta:
+                                pdf_title = getattr(meta, 'title', '') or ''
                     except Exception:
                         # If PyPDF2 fails, leave pages/content empty and continue
                         pass
-
                     content = content.strip()
 
-                    # If pdf_parse requested, try importing pdfplumber at runtime
-                    if pdf_parse:
-                        try:
-                            import importlib
-                            _pdfplumber = importlib.import_module('pdfplumber')
-                        except Exception:
-                            _pdfplumber = None
-                        if _pdfplumber is not None:
-                            try:
-                                with _pdfplumber.open(file_path) as pdf:
-                                    pages = []
-                                    for p in pdf.pages:
-                                        text = p.extract_text() or ""
-                                        page_tables = []
-                                        try:
-                                            for tbl in p.extract_tables():
-                                                # Each table is a list of rows (lists of cell strings)
-                                                page_tables.append(tbl)
-                                                tables.append(tbl)
-                                        except Exception:
-                                            # extracting tables can fail on some pages, continue
-                                            pass
-                                        pages.append({"text": text, "tables": page_tables})
-                                    # Rebuild a concatenated content from pages if empty
-                                    if not content:
-                                        content = "\n".join([p.get("text", "") for p in pages]).strip()
-                            except Exception as e:
-                                print(f"Warning: pdfplumber failed for {file_path}: {e}")
-                    # If there's no content at this point, skip
-                    if not content:
-                        continue
+                # If there's no content at this point, skip
+                if not content:
+                    return docs, doc_paths
 
+                if structured:
+                    doc = {
+                        'id': os.path.splitext(os.path.basename(file_path))[0],
+                        'title': pdf_title,
+                        'content': content,
+                        'category': os.path.basename(os.path.dirname(file_path)),
+                        'pages': pages,
+                        'tables': tables
+                    }
+                    docs.append(doc)
+                    doc_paths.append(file_path)
+                    # If there are tables extracted, also create separate docs for each
+                    if tables:
+                        for ti, tbl in enumerate(tables):
+                            tbl_md = _table_to_markdown(tbl)
+                            table_doc = {
+                                'id': f"{doc['id']}_table_{ti}",
+                                'title': f"{doc.get('title','')}' table {ti}",
+                                'content': tbl_md,
+                                'category': os.path.basename(os.path.dirname(file_path)),
+                                'source_pdf': doc['id'],
+                                'page_index': None
+                            }
+                            docs.append(table_doc)
+                            doc_paths.append(file_path)
+                else:
+                    docs.append(content)
+                    doc_paths.append(file_path)
+            else:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    content = f.read().strip()
+                    if not content:
+                        return docs, doc_paths
                     if structured:
-                        # Try to extract title from PDF metadata (PyPDF2 reader may exist)
+                        # Extract title as first non-empty line for txt/md
                         title = ""
-                        try:
-                            meta = getattr(reader, 'metadata', None) or getattr(reader, 'documentInfo', None)
-                            if meta:
-                                if isinstance(meta, dict):
-                                    title = meta.get('/Title') or meta.get('title') or ''
+                        for line in content.splitlines():
+                            line = line.strip()
+                            if line:
+                                # If markdown heading, strip leading #'s
+                                if line.startswith('#'):
+                                    title = line.lstrip('#').strip()
                                 else:
-                                    title = getattr(meta, 'title', '') or ''
-                        except Exception:
-                            title = ''
+                                    title = line
+                                break
                         doc = {
                             'id': os.path.splitext(os.path.basename(file_path))[0],
                             'title': title,
                             'content': content,
-                            'category': os.path.basename(os.path.dirname(file_path)),
-                            'pages': pages,
-                            'tables': tables
+                            'category': os.path.basename(os.path.dirname(file_path))
                         }
                         docs.append(doc)
                         doc_paths.append(file_path)
-                        # If there are tables extracted, also create separate docs for each
-                        if tables:
-                            for ti, tbl in enumerate(tables):
-                                tbl_md = _table_to_markdown(tbl)
-                                table_doc = {
-                                    'id': f"{doc['id']}_table_{ti}",
-                                    'title': f"{doc.get('title','')}' table {ti}",
-                                    'content': tbl_md,
-                                    'category': os.path.basename(os.path.dirname(file_path)),
-                                    'source_pdf': doc['id'],
-                                    'page_index': None
-                                }
-                                docs.append(table_doc)
-                                doc_paths.append(file_path)
                     else:
                         docs.append(content)
                         doc_paths.append(file_path)
-                else:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        content = f.read().strip()
-                        if not content:
-                            continue
-                        if structured:
-                            # Extract title as first non-empty line for txt/md
-                            title = ""
-                            for line in content.splitlines():
-                                line = line.strip()
-                                if line:
-                                    # If markdown heading, strip leading #'s
-                                    if line.startswith('#'):
-                                        title = line.lstrip('#').strip()
-                                    else:
-                                        title = line
-                                    break
-                            doc = {
-                                'id': os.path.splitext(os.path.basename(file_path))[0],
-                                'title': title,
-                                'content': content,
-                                'category': os.path.basename(os.path.dirname(file_path))
-                            }
-                            docs.append(doc)
-                            doc_paths.append(file_path)
-                        else:
-                            docs.append(content)
-                            doc_paths.append(file_path)
+    except Exception as e:
+        print(f"Warning: Could not read {file_path}: {e}")
+
+    return docs, doc_paths
+
+
+def read_docs(structured: bool = False, pdf_parse: bool = False):
+    """Read documents from the `catalog/` directory.
+
+    If `structured` is False (default) returns (docs_texts, paths) where docs_texts
+    is a list of strings (document contents) and paths the matching file paths.
+
+    If `structured` is True the function will also load .json/.jsonl/.yml/.yaml
+    files and return (docs, paths) where docs is a list of dicts containing at
+    least 'content' and optional 'id', 'title', 'category'. For backwards
+    compatibility, PDF/TXT/MD files still return plain string documents.
+    """
+    # One walk over catalog/ instead of a recursive glob per file pattern
+    # (each glob re-stats the whole tree). Bucket by extension as we go.
+    wanted = {'.txt', '.md', '.pdf'}
+    if structured:
+        wanted |= {'.json', '.jsonl', '.ndjson', '.yml', '.yaml'}
+
+    files = []
+    for root, _, names in os.walk('catalog'):
+        for n in names:
+            if os.path.splitext(n)[1].lower() in wanted:
+                files.append(os.path.join(root, n))
+    files.sort()
+
+    # PDF parsing is CPU-bound pure Python, so fan out across processes when
+    # there is more than one file; fall back to serial parsing if the pool
+    # can't start (e.g. restricted environments). The start method is pinned
+    # to spawn so behaviour matches across platforms — spawn workers re-import
+    # the caller's __main__, so entry points must keep their launch/serve
+    # calls under an __name__ == "__main__" guard.
+    parse = functools.partial(_parse_one, structured=structured, pdf_parse=pdf_parse)
+    if len(files) > 1:
+        try:
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(len(files), os.cpu_count() or 1), mp_context=ctx) as ex:
+                results = list(ex.map(parse, files))
         except Exception as e:
-            print(f"Warning: Could not read {file_path}: {e}")
+            print(f"Warning: parallel parse failed ({e}), falling back to serial")
+            results = [parse(f) for f in files]
+    else:
+        results = [parse(f) for f in files]
+
+    docs = []
+    doc_paths = []
+    for file_docs, file_paths in results:
+        docs.extend(file_docs)
+        doc_paths.extend(file_paths)
 
     return docs, doc_paths
 
@@ -256,7 +284,7 @@ def get_doc_info():
     """Get document information for display"""
     # Default to structured-aware call so structured docs are recognized
     docs, paths = read_docs(structured=True)
-    
+
     print(f"📚 Loaded {len(docs)} documents")
     print("\nDocuments:")
     for i, (doc, path) in enumerate(zip(docs, paths)):
@@ -269,6 +297,5 @@ def get_doc_info():
             print(f"{i+1}. [{rel_path}] {preview}{more}")
         else:
             print(f"{i+1}. [{rel_path}] {doc[:80]}{'...' if len(doc) > 80 else ''}")
-    
-    return docs, paths
 
+    return docs, paths
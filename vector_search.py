@@ -1,78 +1,263 @@
+"""
+Vector search and prompt assembly for the RAG pipeline.
+
+The hot path (similarity math, result assembly, context building) is kept on
+numpy arrays and single join calls, so the time spent in Python bytecode is
+negligible next to the Chroma query and the LLM round trip. Compiling this
+module to a Cython extension was considered and rejected: the repo ships as
+plain scripts with no build step, and profiling the interpreter glue that
+remains would not repay the packaging cost. Revisit only if a profile ever
+shows this module dominating per-turn latency.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
 
+import numpy as np
+
+
+def _distances_to_similarities(distances):
+    """Distance -> similarity kernel for a float32 array — one vectorized
+    numpy op, so the conversion cost doesn't scale with Python-level loops."""
+    return 1.0 - distances
+
+# Semantic cache in front of the vector DB: queries are bucketed by
+# random-projection LSH of their embedding, so a near-duplicate of a recently
+# served question skips the Chroma round trip entirely. A hit still has to
+# pass a cosine-similarity check against the stored embedding, so only truly
+# close queries reuse results.
+_LSH_TABLES = 8
+_LSH_BITS = 12
+_LSH_PROJECTIONS = None  # lazily built (tables, bits, dim) once dim is known
+_SEM_CACHE = OrderedDict()  # bucket key -> (embedding, results, timestamp)
+_SEM_CACHE_MAX = 256
+_SEM_CACHE_TTL = 300.0  # seconds
+_SEM_SIM_THRESHOLD = 0.95
+
+
+# Intern pool for retrieved chunk text: the same catalog chunks come back
+# turn after turn, but Chroma allocates a fresh str each time. Reusing one
+# object per chunk id keeps repeat turns on memory the tokenizer has likely
+# touched already. (A WeakValueDictionary would be the natural fit, but str
+# doesn't support weak references, so this is a small LRU-bounded dict.)
+_CONTENT_POOL = OrderedDict()
+_CONTENT_POOL_MAX = 1024
+
+
+def _intern_content(doc_id: str, content: str) -> str:
+    pooled = _CONTENT_POOL.get(doc_id)
+    if pooled == content:
+        _CONTENT_POOL.move_to_end(doc_id)
+        return pooled
+    _CONTENT_POOL[doc_id] = content
+    _CONTENT_POOL.move_to_end(doc_id)
+    while len(_CONTENT_POOL) > _CONTENT_POOL_MAX:
+        _CONTENT_POOL.popitem(last=False)
+    return content
+
+
+def _as_unit_f32(embedding):
+    """Contiguous float32, unit norm. Stored vectors are normalized at ingest
+    and the collection uses inner-product space, so normalizing the query here
+    is what keeps every downstream distance a plain dot product — and it makes
+    the function safe for callers whose embeddings aren't already unit-norm."""
+    q = np.ascontiguousarray(embedding, dtype=np.float32)
+    return q / (np.linalg.norm(q) + 1e-12)
+
+
+def _lsh_keys(collection, embedding, top_k):
+    """Bucket keys for an embedding: one sign-bit tuple per hash table.
+
+    Keys carry the collection identity (same id() scheme as _batchers) so a
+    hit can never hand one collection's results to a query against another.
+    """
+    global _LSH_PROJECTIONS
+    if _LSH_PROJECTIONS is None:
+        rng = np.random.default_rng(0)  # fixed seed: stable buckets per process
+        _LSH_PROJECTIONS = rng.standard_normal((_LSH_TABLES, _LSH_BITS, embedding.shape[0])).astype(np.float32)
+    bits = (_LSH_PROJECTIONS @ embedding) >= 0
+    return [(id(collection), t, tuple(bits[t].tolist()), top_k) for t in range(_LSH_TABLES)]
+
+
+def _semantic_cache_get(collection, embedding, top_k):
+    now = time.monotonic()
+    for key in _lsh_keys(collection, embedding, top_k):
+        entry = _SEM_CACHE.get(key)
+        if entry is None:
+            continue
+        cached_embedding, results, stamp = entry
+        if now - stamp > _SEM_CACHE_TTL:
+            _SEM_CACHE.pop(key, None)
+            continue
+        if float(cached_embedding @ embedding) >= _SEM_SIM_THRESHOLD:
+            _SEM_CACHE.move_to_end(key)
+            return results
+    return None
+
+
+def _semantic_cache_put(collection, embedding, top_k, results):
+    stamp = time.monotonic()
+    for key in _lsh_keys(collection, embedding, top_k):
+        _SEM_CACHE[key] = (embedding, results, stamp)
+        _SEM_CACHE.move_to_end(key)
+    while len(_SEM_CACHE) > _SEM_CACHE_MAX:
+        _SEM_CACHE.popitem(last=False)  # evict least recently used
+
+
 def search_vector_database(collection, query_embedding, top_k: int = 3):
     """
     Query the vector collection and return a list of results with similarity scores.
+
+    Near-duplicate queries (cosine >= 0.95 against a recently served one) are
+    answered from the in-process semantic cache without hitting the DB.
     """
+    # Contiguous unit-norm float32 up front: the cache, Chroma and any SIMD
+    # kernel downstream all consume the same aligned buffer without a copy
+    query_embedding = _as_unit_f32(query_embedding)
+    cached = _semantic_cache_get(collection, query_embedding, top_k)
+    if cached is not None:
+        return cached
+
+    # Chroma accepts ndarrays directly — no .tolist() round trip boxing
+    # every dimension into a Python float. include= keeps the response to
+    # the three fields we actually read (by default Chroma would also
+    # deserialize fields like embeddings we never touch).
     results = collection.query(
-        query_embeddings=[query_embedding.tolist()],
-        n_results=top_k
+        query_embeddings=query_embedding.reshape(1, -1),
+        n_results=top_k,
+        include=["documents", "distances", "metadatas"]
     )
 
-    # Process and display results
-    search_results = []
-    for i, (doc_id, distance, content, metadata) in enumerate(zip(
-        results['ids'][0],
-        results['distances'][0],
-        results['documents'][0],
-        results['metadatas'][0]
-    )):
-        similarity = 1 - distance  # Convert distance to similarity
-        search_results.append({
-            'id': doc_id,
-            'content': content,
-            'metadata': metadata,
-            'similarity': similarity
-        })
-
+    search_results = _assemble_row(results, 0)
+    _semantic_cache_put(collection, query_embedding, top_k, search_results)
     return search_results
 
 
-def augment_prompt_with_context(
-    query: str,
-    search_results: List[Dict],
-    history_text: Optional[str] = None,
-    use_history: bool = True,
-) -> str:
+def _assemble_row(results, row: int, similarities=None) -> Dict:
+    """Build the per-query result dict from one row of a Chroma query response.
+
+    Results use a struct-of-arrays layout — parallel 'ids'/'contents'/
+    'metadatas' lists plus a float32 'similarities' array — instead of one
+    dict allocation per hit. Similarities stay a 4-byte-per-element numpy
+    array end to end; no boxed Python floats. Batch callers can pass a
+    precomputed `similarities` row to skip the per-row conversion.
     """
-    Build augmented prompt with retrieved context for LLM. If `use_history` is True and
-    `history_text` is provided, the chat history will be injected and given priority over
-    the vector search context in case of conflict.
+    ids = results['ids'][row]
+    metadatas = results['metadatas'][row]
+    if similarities is None:
+        # one vectorized op instead of a Python subtract per result
+        similarities = _distances_to_similarities(np.asarray(results['distances'][row], dtype=np.float32))
+    return {
+        'ids': ids,
+        'contents': [_intern_content(doc_id, content)
+                     for doc_id, content in zip(ids, results['documents'][row])],
+        'metadatas': metadatas,
+        # titles are pre-filled at ingest, so this is a direct index with no
+        # per-result default chain
+        'titles': [(m['title'] if m else '') for m in metadatas],
+        'similarities': similarities,
+    }
+
+
+def search_vector_database_batch(collection, query_embeddings, top_k: int = 3):
+    """Run several queries as one collection.query call.
+
+    `query_embeddings` is a (B, D) array (or list of 1D arrays); returns one
+    result list per query, in order. The vectorized distance math amortizes
+    memory traffic across the whole batch.
     """
-    # Assemble context from search results
-    context_parts = []
-    for i, result in enumerate(search_results, 1):
-        title = result.get('metadata', {}).get('title', f'Doc {i}')
-        context_parts.append(f"Source {i}: {title}\n{result['content']}")
-
-    context = "\n\n".join(context_parts) if context_parts else "(no retrieved documents)"
-
-    # Prepare history section if available
-    history_section = history_text if (use_history and history_text) else None
-
-    # Build augmented prompt - before sending to LLM
-    priority_note = (
-        "IMPORTANT: If the chat history contains information that conflicts with the"
-        " retrieved catalog context, prefer the chat history and act accordingly."
-        if history_section
-        else ""
+    batch = np.ascontiguousarray(np.vstack(query_embeddings), dtype=np.float32)
+    results = collection.query(
+        query_embeddings=batch,
+        n_results=top_k,
+        include=["documents", "distances", "metadatas"]
     )
+    # Convert the whole (B, top_k) distance matrix in one contiguous float32
+    # buffer rather than one array per row
+    sims_matrix = _distances_to_similarities(np.asarray(results['distances'], dtype=np.float32))
+    rows = []
+    for row in range(batch.shape[0]):
+        search_results = _assemble_row(results, row, similarities=sims_matrix[row])
+        _semantic_cache_put(collection, batch[row], top_k, search_results)
+        rows.append(search_results)
+    return rows
+
+
+# Micro-batching for concurrent queries: callers on the async path enqueue
+# their embedding and a short collection window (10 ms, max 32 queries)
+# stacks everything pending into a single vector DB call.
+_BATCH_MAX = 32
+_BATCH_WAIT = 0.01  # seconds
+_batchers = {}
+
+
+class _QueryBatcher:
+    def __init__(self, collection, top_k: int):
+        self.collection = collection
+        self.top_k = top_k
+        self.pending = []
+        self._drain_task = None
 
-    augmented_prompt = f"""
-You are a knowledgeable and friendly university assistant.
-{priority_note}
-Use the following course catalog information and any relevant reasoning to answer the user's question.
+    async def submit(self, query_embedding):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((query_embedding, future))
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = loop.create_task(self._drain())
+        return await future
 
-CHAT HISTORY:
-{history_section or '(no chat history available)'}
+    async def _drain(self):
+        await asyncio.sleep(_BATCH_WAIT)
+        while self.pending:
+            batch, self.pending = self.pending[:_BATCH_MAX], self.pending[_BATCH_MAX:]
+            embeddings = [e for e, _ in batch]
+            loop = asyncio.get_running_loop()
+            try:
+                rows = await loop.run_in_executor(
+                    None, search_vector_database_batch, self.collection, embeddings, self.top_k
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), search_results in zip(batch, rows):
+                if not future.done():
+                    future.set_result(search_results)
 
-COURSE CATALOG CONTEXT:
-{context}
 
-STUDENT QUESTION:
-{query}
+async def asearch_vector_database(collection, query_embedding, top_k: int = 3):
+    """Async variant of `search_vector_database` that micro-batches concurrent
+    queries into a single DB call. Cache hits return immediately."""
+    query_embedding = _as_unit_f32(query_embedding)
+    cached = _semantic_cache_get(collection, query_embedding, top_k)
+    if cached is not None:
+        return cached
+    key = (id(collection), top_k)
+    batcher = _batchers.get(key)
+    if batcher is None:
+        batcher = _batchers[key] = _QueryBatcher(collection, top_k)
+    return await batcher.submit(query_embedding)
 
-GUIDELINES:
+
+# Static prompt sections, hoisted so each call only joins a short list of
+# precomputed strings instead of re-executing a large multi-line f-string.
+# Optional sections (priority note, chat history) are dropped entirely when
+# empty — LLM prefill cost is linear in tokens, so no filler lines.
+_PROMPT_HEAD = (
+    "You are a knowledgeable and friendly university assistant.\n"
+    "Use the following course catalog information and any relevant reasoning to answer the user's question."
+)
+_PRIORITY_NOTE = (
+    "IMPORTANT: If the chat history contains information that conflicts with the"
+    " retrieved catalog context, prefer the chat history and act accordingly."
+)
+_NO_CONTEXT = "(no retrieved documents)"
+_PROMPT_GUIDELINES = """GUIDELINES:
 - dont give answers that are not relevant to the question, make sure your answers are based on the catalog context and chat history.
 - Never mention the source of the information in the answer.
 - dont say hello, hi, or any other pleasantries unless the user does first.
@@ -82,4 +267,126 @@ GUIDELINES:
 - If the answer cannot be found in the catalog or history, say so naturally.
 """
 
-    return augmented_prompt
\ No newline at end of file
+
+def search_collections(collections, query_embedding, top_k: int = 3):
+    """Search several collections concurrently and merge to one global top-k.
+
+    Chroma releases the GIL during its native search, so a thread per
+    collection overlaps the index traversals. The per-collection results are
+    concatenated and reduced with argpartition (O(n) selection) rather than a
+    full sort.
+    """
+    if len(collections) == 1:
+        return search_vector_database(collections[0], query_embedding, top_k)
+
+    with ThreadPoolExecutor(max_workers=len(collections)) as ex:
+        parts = list(ex.map(
+            lambda collection: search_vector_database(collection, query_embedding, top_k),
+            collections
+        ))
+
+    similarities = np.concatenate([p['similarities'] for p in parts])
+    ids = [doc_id for p in parts for doc_id in p['ids']]
+    contents = [c for p in parts for c in p['contents']]
+    metadatas = [m for p in parts for m in p['metadatas']]
+    titles = [t for p in parts for t in p['titles']]
+
+    if len(similarities) > top_k:
+        keep = np.argpartition(-similarities, top_k)[:top_k]
+    else:
+        keep = np.arange(len(similarities))
+    keep = keep[np.argsort(-similarities[keep])]
+
+    return {
+        'ids': [ids[i] for i in keep],
+        'contents': [contents[i] for i in keep],
+        'metadatas': [metadatas[i] for i in keep],
+        'titles': [titles[i] for i in keep],
+        'similarities': similarities[keep],
+    }
+
+
+# Memoized final prompts: the output of augment_prompt_with_context depends
+# only on the retrieved ids (content-hash ids pin the chunk text), the query
+# and the history text, so recurring turns skip the whole build. Keyed by a
+# blake2b digest of the ids plus the raw query/history strings, LRU-bounded
+# like the semantic cache. (xxhash would be marginally faster but isn't a
+# project dependency.)
+_PROMPT_CACHE = OrderedDict()
+_PROMPT_CACHE_MAX = 1024
+
+
+def _prompt_cache_key(search_results, query, history_text, use_history):
+    ids_digest = hashlib.blake2b(
+        "\x00".join(search_results['ids']).encode("utf-8"), digest_size=8
+    ).digest()
+    return (ids_digest, query, history_text or '', use_history)
+
+
+# Specialized prompt builders, one per history mode, so the per-call path is
+# a single dispatch plus one join with no branches or default expansions
+def _build_with_history(query: str, context: str, history_text: str) -> str:
+    return "\n\n".join((
+        _PROMPT_HEAD,
+        _PRIORITY_NOTE,
+        f"CHAT HISTORY:\n{history_text}",
+        f"COURSE CATALOG CONTEXT:\n{context}",
+        f"STUDENT QUESTION:\n{query}",
+        _PROMPT_GUIDELINES,
+    ))
+
+
+def _build_without_history(query: str, context: str) -> str:
+    return "\n\n".join((
+        _PROMPT_HEAD,
+        f"COURSE CATALOG CONTEXT:\n{context}",
+        f"STUDENT QUESTION:\n{query}",
+        _PROMPT_GUIDELINES,
+    ))
+
+
+def augment_prompt_with_context(
+    query: str,
+    search_results: Dict,
+    history_text: Optional[str] = None,
+    use_history: bool = True,
+) -> str:
+    """
+    Build augmented prompt with retrieved context for LLM. `search_results` is
+    the struct-of-arrays dict returned by `search_vector_database`. If
+    `use_history` is True and `history_text` is provided, the chat history will
+    be injected and given priority over the vector search context in case of
+    conflict.
+
+    Prompts are memoized on (retrieved ids, query, history), so a repeat turn
+    in a sticky session skips the whole build.
+    """
+    key = _prompt_cache_key(search_results, query, history_text, use_history)
+    cached = _PROMPT_CACHE.get(key)
+    if cached is not None:
+        _PROMPT_CACHE.move_to_end(key)
+        return cached
+
+    # Assemble context from the parallel titles/contents arrays. The stable
+    # chunk ids stay out of the prompt text — they ride along out-of-band in
+    # search_results['ids'] (and key the memo above), so a KV-cache-aware
+    # backend can still track chunk identity without spending prompt tokens
+    # on hash tags the model might echo. Titles come pre-filled from ingest,
+    # so no default chain per result.
+    context = "\n\n".join(
+        f"Source {i}: {title}\n{content}"
+        for i, (title, content) in enumerate(
+            zip(search_results['titles'], search_results['contents']), 1
+        )
+    ) or _NO_CONTEXT
+
+    # Dispatch once on history mode; each builder is a single branch-free join
+    if use_history and history_text:
+        prompt = _build_with_history(query, context, history_text)
+    else:
+        prompt = _build_without_history(query, context)
+
+    _PROMPT_CACHE[key] = prompt
+    while len(_PROMPT_CACHE) > _PROMPT_CACHE_MAX:
+        _PROMPT_CACHE.popitem(last=False)
+    return prompt
\ No newline at end of file